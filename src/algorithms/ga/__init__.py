@@ -1 +1 @@
-from .ga import generate_population, run_evolution
+from .ga import generate_population, run_evolution, load_score_cache, save_score_cache
@@ -1,21 +1,55 @@
-from random import choices, randint, sample, uniform
-from typing import List, Tuple
-import copy
+from random import randint, sample, uniform
+from typing import Dict, List, Optional, Tuple
+from operator import itemgetter
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import json
+import multiprocessing
 import pprint
-import subprocess
-import xml.etree.ElementTree as ET
 import os
 import tempfile
 
+import libsumo
+import numpy as np
+from lxml import etree as ET
+
 from common.typings import (
+    PhaseConfig,
     TrafficConfiguration,
     Population,
     FitnessFunc,
-    IntersectionParams
+    IntersectionParams,
+    ScoreCache
 )
-from common.xml_generators import generate_tl_logic
+from common.xml_generators import precompute_groups, write_tl_logic
 from algorithms.websters.websters import compute_signal_config_with_poisson
 
+# Per-evaluation tl_logic.xml and tripinfo.xml are written and read back right
+# away, so keep them on tmpfs where available
+_SCRATCH_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+# Fitness workers are started from a clean server process (spawned where
+# there is no forkserver) instead of forking the caller, which may already
+# run threads of its own, e.g. another executor's
+_POOL_CONTEXT = multiprocessing.get_context(
+    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods()
+    else 'spawn')
+
+# Everything below decides a fitness score besides the configuration itself,
+# so it is all part of the persisted score cache's digest (see _cache_digest)
+_SCORE_CACHE_FORMAT = 2
+_MIN_GREEN = 5
+_SCORE_WEIGHTS = {'time_loss': 0.5, 'waiting': 0.4, 'stops': 0.4, 'delays': 0.05}
+_SCORE_DECIMALS = 2
+_SUMO_ARGS = (
+    "-n", "data/net.xml",
+    "-r", "data/routes.xml",
+    # nobody reads SUMO's console output during the GA
+    "--no-step-log", "true",
+    "--no-warnings", "true",
+    "--duration-log.disable", "true"
+)
+
 
 def generate_population(
     size: int,
@@ -38,65 +72,75 @@ def generate_population(
     return population
 
 
-def selection(
+def tournament_selection(
     population: Population,
-    fitness_func: FitnessFunc
+    scores: List[float],
+    k: int = 3
 ) -> Population:
     """
-    Selects two individuals from the population based on fitness-proportional selection (roulette wheel).
+    Selects two individuals from the population using tournament selection.
 
-    Each individual is assigned a selection probability proportional to its fitness score.
-    Higher-fitness individuals are more likely to be selected, allowing the algorithm to favor
-    better-performing configurations while maintaining diversity.
+    For each parent, `k` distinct individuals are drawn at random and the one with
+    the lowest (best) fitness score wins. Only the contenders' scores are looked at,
+    and the selection pressure does not depend on the scale of the scores.
 
     Args:
         population (Population): A list of traffic configurations (individuals).
-        fitness_func (FitnessFunc): A function that takes a traffic configuration and returns its fitness score.
+        scores (List[float]): Fitness score of each individual (lower is better).
+        k (int, optional): Tournament size. Defaults to 3.
 
     Returns:
         Population: A list containing two selected individuals from the input population.
     """
-    return choices(
-        population=population,
-        weights=[fitness_func(traffic_configuration)
-                 for traffic_configuration in population],
-        k=2
-    )
+    k = min(k, len(population))
+    parents = []
+    for _ in range(2):
+        contenders = sample(range(len(population)), k)
+        parents.append(population[min(contenders, key=scores.__getitem__)])
+    return parents
 
 
 def _evaluate_config(traffic_configuration: TrafficConfiguration, workdir: str) -> float:
     """Run SUMO in `workdir`, parse tripinfo.xml, and compute the weighted score."""
-    # write TL‐logic
-    generate_tl_logic('data/connections.xml',
-                      f'{workdir}/tl_logic.xml', traffic_configuration)
+    # write TL‐logic (connections.xml is parsed once per process)
     xml_path = os.path.join(workdir, "tl_logic.xml")
+    write_tl_logic(precompute_groups('data/connections.xml'),
+                   xml_path, traffic_configuration)
 
-    # run SUMO
+    # run SUMO in-process; libsumo skips the fork/exec of a sumo binary
     tripinfo_path = os.path.join(workdir, "tripinfo.xml")
     sumo_cmd = [
         "sumo",
-        "-n", "data/net.xml",
-        "-r", "data/routes.xml",
+        *_SUMO_ARGS,
         "--additional-files", xml_path,
-        "--tripinfo-output", tripinfo_path,
-        "--verbose"
+        "--tripinfo-output", tripinfo_path
     ]
-    subprocess.run(sumo_cmd, stdout=subprocess.DEVNULL,
-                   stderr=subprocess.DEVNULL, check=True)
-
-    # parse results
-    tree = ET.parse(tripinfo_path)
-    root = tree.getroot()
+    # A fresh start/close per evaluation is deliberate: libsumo.load() re-reads
+    # the network and routes just like start() (both take ~10 ms here against
+    # ~0.6 s of stepping), and tripinfo.xml is only guaranteed complete once
+    # the simulation is closed.
+    libsumo.start(sumo_cmd)
+    try:
+        while libsumo.simulation.getMinExpectedNumber() > 0:
+            libsumo.simulationStep()
+    finally:
+        # closing flushes tripinfo.xml
+        libsumo.close()
+
+    # parse results, streaming so only one <tripinfo> is alive at a time
     total_time_loss = total_waiting = 0.0
     total_stops = delayed = count = 0
 
-    for trip in root.findall('tripinfo'):
+    for _, trip in ET.iterparse(tripinfo_path, events=('end',), tag='tripinfo'):
         count += 1
         total_time_loss += float(trip.get('timeLoss', 0))
         total_waiting += float(trip.get('waitingTime', 0))
         total_stops += int(trip.get('waitingCount', 0))
         if float(trip.get('departDelay', 0)) > 0:
             delayed += 1
+        trip.clear()
+        while trip.getprevious() is not None:
+            del trip.getparent()[0]
 
     if count == 0:
         return float('inf')
@@ -108,25 +152,24 @@ def _evaluate_config(traffic_configuration: TrafficConfiguration, workdir: str)
     delayed_ratio = delayed / count
 
     # weighted score
-    w = {'time_loss': 0.5, 'waiting': 0.4, 'stops': 0.4, 'delays': 0.05}
+    w = _SCORE_WEIGHTS
     score = (
         w['time_loss'] * avg_time_loss +
         w['waiting'] * avg_waiting +
         w['stops'] * stops_per_trip +
         w['delays'] * delayed_ratio
     )
-    return round(score, 2)
+    return round(score, _SCORE_DECIMALS)
 
 
 def fitness(traffic_configuration: TrafficConfiguration) -> float:
     """Evaluate traffic config using SUMO simulation metrics."""
     # quick green‐time sanity check
-    min_green = 5
-    if any(phase.green < min_green for phase in traffic_configuration):
+    if any(phase.green < _MIN_GREEN for phase in traffic_configuration):
         return float('inf')
 
     # isolate each run in its own tempdir
-    with tempfile.TemporaryDirectory() as workdir:
+    with tempfile.TemporaryDirectory(dir=_SCRATCH_DIR) as workdir:
         try:
             return _evaluate_config(traffic_configuration, workdir)
         except Exception as e:
@@ -163,30 +206,25 @@ def n_point_crossover(
     crossover_points = sorted(sample(range(1, num_phases), n))
     crossover_points.append(num_phases)  # Add endpoint
 
-    # Initialize offspring
+    # Build both offspring phase by phase, alternating parents at each
+    # crossover point and enforcing minimum green times in the same pass
     child1 = []
     child2 = []
     prev_point = 0
 
-    # Alternate parents at each crossover segment
     use_a = True
     for point in crossover_points:
-        segment = slice(prev_point, point)
-
-        if use_a:
-            child1.extend(copy.deepcopy(a[segment]))
-            child2.extend(copy.deepcopy(b[segment]))
-        else:
-            child1.extend(copy.deepcopy(b[segment]))
-            child2.extend(copy.deepcopy(a[segment]))
+        src1, src2 = (a, b) if use_a else (b, a)
+        for k in range(prev_point, point):
+            p1, p2 = src1[k], src2[k]
+            child1.append(PhaseConfig(
+                max(min_green, p1.green), p1.amber, p1.all_red))
+            child2.append(PhaseConfig(
+                max(min_green, p2.green), p2.amber, p2.all_red))
 
         use_a = not use_a
         prev_point = point
 
-    # Enforce minimum green times
-    for phase in child1 + child2:
-        phase.green = max(min_green, phase.green)
-
     return child1, child2
 
 
@@ -251,81 +289,187 @@ def mutation(
     if num_phases <= 1:
         return traffic_configuration
 
-    mutated_configuration = copy.deepcopy(traffic_configuration)
+    # green times are whole seconds (tl_logic.xml writes them verbatim)
+    greens = np.fromiter((phase.green for phase in traffic_configuration),
+                         dtype=np.int64, count=num_phases)
+    floor = int(min_green)
 
     i = randint(0, num_phases - 1)
     mutation = uniform(-delta, delta)
 
-    mutated_configuration[i].green += int(mutation)
+    greens[i] += int(mutation)
 
-    if mutated_configuration[i].green < min_green:
-        mutation += min_green - mutated_configuration[i].green
-        mutated_configuration[i].green = min_green
+    if greens[i] < floor:
+        mutation += floor - greens[i]
+        greens[i] = floor
 
     redistribution = int(-mutation / (num_phases - 1))
 
-    for j in range(num_phases):
-        if j == i:
-            continue
-        mutated_configuration[j].green += redistribution
-        if mutated_configuration[j].green < min_green:
-            mutated_configuration[j].green = min_green
+    others = np.arange(num_phases) != i
+    greens[others] += redistribution
+    np.maximum(greens, floor, out=greens)
+
+    return [PhaseConfig(green=int(green), amber=phase.amber, all_red=phase.all_red)
+            for green, phase in zip(greens, traffic_configuration)]
+
+
+def _config_key(traffic_configuration: TrafficConfiguration) -> Tuple:
+    """Hashable key identifying a configuration by its phase timings."""
+    return tuple((phase.green, phase.amber, phase.all_red)
+                 for phase in traffic_configuration)
 
-    for phase in mutated_configuration:
-        if phase.green < min_green:
-            phase.green = min_green
 
-    return mutated_configuration
+def _cache_digest(input_paths: List[str]) -> str:
+    """Digest of everything a `fitness` score depends on besides the configuration."""
+    digest = hashlib.sha256()
+    settings = (_SCORE_CACHE_FORMAT, libsumo.getVersion(), _SUMO_ARGS,
+                sorted(_SCORE_WEIGHTS.items()), _SCORE_DECIMALS, _MIN_GREEN)
+    digest.update(repr(settings).encode())
+    for path in input_paths:
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def load_score_cache(cache_path: str, input_paths: List[str]) -> ScoreCache:
+    """
+    Loads `fitness` scores saved by `save_score_cache` for reuse by `run_evolution`.
+
+    Args:
+        cache_path: JSON file written by a previous run.
+        input_paths: Files the simulation is built from (network sources, routes).
+            Scores saved against different file contents, SUMO version or options,
+            or scoring settings are discarded.
+
+    Returns:
+        ScoreCache: The saved scores, or an empty cache if there are none usable.
+    """
+    # Plain JSON rather than pickle, so a tampered or foreign file can at
+    # worst yield wrong scores, never run code
+    try:
+        with open(cache_path, encoding='utf-8') as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+    if not isinstance(saved, dict) or saved.get('inputs') != _cache_digest(input_paths):
+        return {}
+    try:
+        # [[[green, amber, all_red], ...], score] pairs back to _config_key keys
+        return {tuple(tuple(phase) for phase in key): float(score)
+                for key, score in saved['scores']}
+    except (KeyError, TypeError, ValueError):
+        return {}
+
+
+def save_score_cache(
+    cache_path: str,
+    input_paths: List[str],
+    score_cache: ScoreCache
+) -> None:
+    """Saves the finite scores of `score_cache`, tagged with the simulation inputs."""
+    # failed simulations (inf) may be transient, so they are not persisted;
+    # JSON has no tuple keys, so entries are stored as [key, score] pairs
+    scores = [[key, score] for key, score in score_cache.items()
+              if score != float('inf')]
+    with open(cache_path, 'w', encoding='utf-8') as f:
+        json.dump({'inputs': _cache_digest(input_paths),
+                   'scores': scores}, f)
 
 
 def run_evolution(
     population: Population,
     fitness_func: FitnessFunc = fitness,
-    generation_limit: int = 50
+    generation_limit: int = 50,
+    max_workers: Optional[int] = None,
+    score_cache: Optional[ScoreCache] = None
 ) -> Tuple[Population, int]:
     # Convert dictionary to list of configurations
     pprint.pprint(population)
 
+    # Every fitness call is a full SUMO run, so each distinct configuration
+    # is scored once and reused for sorting, selection, logging and any
+    # later generation it survives into (e.g. the retained elite). A cache
+    # passed in (see load_score_cache) is used and filled in place; it holds
+    # `fitness` scores, so it cannot be combined with another fitness_func.
+    if score_cache is None:
+        score_cache = {}
+    elif fitness_func is not fitness:
+        raise ValueError("score_cache can only be used with the default fitness")
+
+    def rank_population(
+        configs: Population
+    ) -> Tuple[List[float], Population]:
+        # Simulate the not-yet-scored configurations in parallel; each
+        # fitness call already runs SUMO in its own temporary directory.
+        pending: Dict[Tuple, TrafficConfiguration] = {}
+        for config in configs:
+            key = _config_key(config)
+            if key not in score_cache and key not in pending:
+                pending[key] = config
+        if pending:
+            scores = pool.map(fitness_func, pending.values())
+            score_cache.update(zip(pending.keys(), scores))
+
+        # Decorate-sort-undecorate: fitness is looked up exactly once per
+        # individual and ties keep their original order.
+        decorated = [(score_cache[_config_key(config)], idx, config)
+                     for idx, config in enumerate(configs)]
+        decorated.sort(key=itemgetter(0, 1))
+        return ([score for score, _, _ in decorated],
+                [config for _, _, config in decorated])
+
     generation = 0
 
-    for generation in range(generation_limit):
-        print(f"\n--- Generation {generation+1}/{generation_limit} ---")
-        # Evaluate and sort population by fitness (lower is better)
-        population.sort(key=lambda config: fitness_func(config))
+    # fitness_func is shipped to worker processes, so it must be picklable
+    with ProcessPoolExecutor(max_workers=max_workers,
+                             mp_context=_POOL_CONTEXT) as pool:
+        for generation in range(generation_limit):
+            print(f"\n--- Generation {generation+1}/{generation_limit} ---")
+            # Evaluate and sort population by fitness (lower is better)
+            scores, population = rank_population(population)
+
+            top_1 = population[0]
+            print(f"{top_1}")
+            print(f"{scores[0]}")
 
-        top_1 = population[0]
-        print(f"{top_1}")
-        print(f"{fitness_func(top_1)}")
+            # pprint.pprint(population)
 
-        # pprint.pprint(population)
+            # The better half survives (the elite is re-added unchanged
+            # below); starting from all of population[1:] left no slots for
+            # offspring, so selection and crossover never ran
+            next_gen = population[1:len(population) // 2]
 
-        next_gen = population[1:]
+            # Fill remaining slots through selection, crossover and mutation
+            while len(next_gen) < len(population) - 1:
 
-        # Fill remaining slots through selection, crossover and mutation
-        while len(next_gen) < len(population) - 1:
+                # Select parents using tournament selection
+                parents = tournament_selection(population, scores)
 
-            # Select parents using tournament selection
-            parents = selection(population, fitness_func)
+                # Generate offspring
+                offspring = crossover(parents[0], parents[1])
 
-            # Generate offspring
-            offspring = crossover(parents[0], parents[1])
+                # Mutate and add to new generation
+                next_gen.extend(offspring)
 
-            # Mutate and add to new generation
-            next_gen.extend(offspring)
+            # crossover yields several children at once, drop any overshoot
+            next_gen = [mutation(config)
+                        for config in next_gen[:len(population) - 1]]
 
-        next_gen = [mutation(config) for config in next_gen]
+            # pprint.pprint(next_gen)
 
-        # pprint.pprint(next_gen)
+            # The elite is carried over unchanged; its score stays in
+            # score_cache, so the next ranking does not re-simulate it.
+            next_gen.append(top_1)
 
-        next_gen.append(top_1)
+            population = next_gen
 
-        population = next_gen
+            # print(population)
 
-        # print(population)
+        scores, population = rank_population(population)
 
-    best_score = fitness_func(population[-1])
-    print(f"Best fitness: {best_score}")
-    print(f"Worst fitness: {fitness_func(population[-2])}")
+    print(f"Best fitness: {scores[0]}")
+    print(f"Worst fitness: {scores[-1]}")
 
     # Return sorted population and generation count
-    return sorted(population, key=lambda config: fitness_func(config)), generation
+    return population, generation
@@ -1,5 +1,6 @@
 from math import ceil
 from typing import List
+import numpy as np
 from common.typings import PhaseConfig
 from common.compute import (
     compute_amber_time,
@@ -38,46 +39,46 @@ def compute_signal_config_with_poisson(
     Returns a list of PhaseConfig tuples (green, amber, red) for each phase.
     If Y >= 1, recomputes with a new Poisson realization until Y < 1.
     """
+    # zip() semantics: only phases with both a rate and a saturation flow
+    n = min(len(lambda_rates), len(saturation_flows))
+    lambdas = np.asarray(lambda_rates[:n], dtype=float)
+    saturations = np.asarray(saturation_flows[:n], dtype=float)
+
     while True:
-        # 1) Simulate total arrivals per minute using Poisson
-        normal_flows_per_minute = [
-            simulate_poisson_arrival_rate(q=lam) for lam in lambda_rates]
+        # 1) Simulate total arrivals per minute using Poisson (one draw
+        #    for all phases)
+        normal_flows_per_minute = simulate_poisson_arrival_rate(q=lambdas)
 
         # 2) Compute flow ratios
-        flow_ratios = [(q * 60) / s if s > 0 else 0 for q,
-                       s in zip(normal_flows_per_minute, saturation_flows)]
-        Y = sum(flow_ratios)
+        flow_ratios = np.divide(
+            normal_flows_per_minute * 60, saturations,
+            out=np.zeros(n), where=saturations > 0)
+        Y = float(flow_ratios.sum())
 
         if Y < 1:
             break  # Acceptable configuration found
 
-    # 3) Lost time per phase (reaction + max clearance)
-    amber_times = []
-    all_red_times = []
-    for W in road_widths:
-        amber_time = compute_amber_time(
-            tr=reaction_time, v=vehicle_speed, a=deceleration_rate)
-        amber_times.append(amber_time)
-
-        all_red_time = compute_all_red_time(
-            W=W, L=vehicle_length, v=vehicle_speed)
-        all_red_times.append(all_red_time)
+    # 3) Lost time per phase (reaction + max clearance); amber does not
+    #    depend on the approach width, so it is the same for every phase
+    amber_time = compute_amber_time(
+        tr=reaction_time, v=vehicle_speed, a=deceleration_rate)
+    all_red_times = compute_all_red_time(
+        W=np.asarray(road_widths, dtype=float), L=vehicle_length,
+        v=vehicle_speed)
 
-    L = sum(amber_times + all_red_times)
+    L = amber_time * len(road_widths) + int(all_red_times.sum())
 
     # 4) Webster cycle length
     C = websters_method(L=L, Y=Y)
 
     # 5) Allocate green times
-    green_times = [compute_green_time(y=y, Y=Y, C=C, L=L) for y in flow_ratios]
+    green_times = compute_green_time(y=flow_ratios, Y=Y, C=C, L=L)
 
     # 6) Build phase configurations
-    tl_config = []
-    for i in range(len(green_times)):
-        tl_config.append(PhaseConfig(
-            green=green_times[i],
-            amber=amber_times[i],
-            all_red=all_red_times[i]
-        ))
+    tl_config = [
+        PhaseConfig(green=int(green), amber=amber_time,
+                    all_red=int(all_red))
+        for green, all_red in zip(green_times, all_red_times)
+    ]
 
     return tl_config
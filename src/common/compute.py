@@ -21,40 +21,46 @@ def compute_amber_time(
 
 
 def compute_all_red_time(
-    W: int | float,
+    W: int | float | np.ndarray,
     L: int | float,
     v: int | float
-) -> int:
+) -> int | np.ndarray:
     """Compute the all-red clearance interval
 
     Args:
-        W (int | float): width of the lane approach (m)
+        W (int | float | np.ndarray): width of the lane approach (m), or an
+            array of widths to compute every phase at once
         L (int | float): average vehicle length (m)
         v (int | float): approach speed (m/s)
 
     Returns:
-        int: all‑red clearance interval
+        int | np.ndarray: all‑red clearance interval(s)
     """
+    if isinstance(W, np.ndarray):
+        return np.ceil((W + L) / v).astype(int)
     return ceil((W + L) / v)
 
 
 def compute_green_time(
-    y: int | float,
+    y: int | float | np.ndarray,
     Y: int | float,
     C: int,
     L: int
-) -> int:
+) -> int | np.ndarray:
+    if isinstance(y, np.ndarray):
+        return np.ceil((y * (C - L)) / Y).astype(int)
     return ceil((y * (C - L)) / Y)
 
 
-def simulate_poisson_arrival_rate(q: float) -> int:
+def simulate_poisson_arrival_rate(q: float | np.ndarray) -> int | np.ndarray:
     """
-    Return a single Poisson‐distributed random draw representing
-    the number of arrivals in one time interval, given mean q.
+    Return Poisson‐distributed random draws representing the number of
+    arrivals in one time interval, given mean q.
 
     Args:
-        q: Expected number of arrivals in that interval.
+        q: Expected number of arrivals in that interval, either a scalar or
+            an array of per-phase means (drawn in a single call).
     Returns:
-        An integer count of arrivals.
+        An integer count of arrivals (at least 1), or an array of counts.
     """
-    return max(1, ceil(np.random.poisson(lam=q)))
+    return np.maximum(1, np.random.poisson(lam=q))
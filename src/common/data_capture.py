@@ -1,13 +1,17 @@
+import re
 import subprocess
-import xml.etree.ElementTree as ET
 import traci
-from collections import defaultdict
+import traci.constants as tc
+from lxml import etree as ET
 from pathlib import Path
 from typing import Dict, Union, cast
 from os import PathLike
 
 from .xml_generators import saturation_flow_scenario
 
+_J0_NODE = re.compile(r'<node\b[^>]*\bid="J0"[^>]*>')
+_TYPE_ATTR = re.compile(r'\btype="[^"]*"')
+
 
 def get_average_flow(
     routes_path: Union[str, PathLike[str]] = "data/routes.xml"
@@ -69,54 +73,59 @@ def get_average_flow(
             2: "W_in",
         }
 
+    # A vehicle is counted on the first incoming edge it is seen on, so the
+    # global counted set alone filters out vehicles seen on earlier steps.
     counted_vehicles: set[str] = set()
-    previous_vehicles: Dict[str, set[str]] = {
-        edge: set() for edge in incoming_edges}
 
     try:
-        while cast(int, traci.simulation.getMinExpectedNumber()) > 0:
+        # Subscribe to everything read per step, so each simulationStep()
+        # returns it in one round-trip instead of one TraCI call per value.
+        traci.simulation.subscribe([tc.VAR_MIN_EXPECTED_VEHICLES])
+        for edge in incoming_edges:
+            traci.edge.subscribe(edge, [tc.LAST_STEP_VEHICLE_ID_LIST])
+        if has_traffic_light and active_tls:
+            try:
+                traci.trafficlight.subscribe(
+                    active_tls, [tc.TL_CURRENT_PHASE])
+            except traci.TraCIException:
+                has_traffic_light = False
+
+        expected_vehicles = cast(
+            int, traci.simulation.getMinExpectedNumber())
+        while expected_vehicles > 0:
             traci.simulationStep()
+            expected_vehicles = cast(
+                int, traci.simulation.getSubscriptionResults()[
+                    tc.VAR_MIN_EXPECTED_VEHICLES])
+            edge_results = traci.edge.getAllSubscriptionResults()
 
             if has_traffic_light and active_tls:
-                try:
-                    current_phase: int = cast(
-                        int, traci.trafficlight.getPhase(active_tls)
-                    )
-                    active_incoming: str | None = phase_incoming.get(
+                current_phase = cast(
+                    int | None,
+                    traci.trafficlight.getSubscriptionResults(
+                        active_tls).get(tc.TL_CURRENT_PHASE)
+                )
+                if current_phase is None:
+                    has_traffic_light = False
+                    active_incoming: str | None = None
+                else:
+                    active_incoming = phase_incoming.get(
                         current_phase % 3, None
                     )
-                except traci.TraCIException:
-                    has_traffic_light = False
-                    active_incoming = None
             else:
                 active_incoming = None
 
             if has_traffic_light and active_incoming:
-                current_vehicles = set(
-                    traci.edge.getLastStepVehicleIDs(active_incoming)
-                )
-                new_vehicles = current_vehicles - \
-                    previous_vehicles[active_incoming]
+                edges_to_count: list[str] = [active_incoming]
+            else:
+                edges_to_count = incoming_edges
 
-                for veh_id in new_vehicles:
+            for edge in edges_to_count:
+                for veh_id in edge_results[edge][tc.LAST_STEP_VEHICLE_ID_LIST]:
                     if veh_id not in counted_vehicles:
-                        vehicle_counts[active_incoming] += 1
+                        vehicle_counts[edge] += 1
                         counted_vehicles.add(veh_id)
 
-                previous_vehicles[active_incoming] = current_vehicles.copy()
-            else:
-                for edge in incoming_edges:
-                    current_vehicles = set(
-                        traci.edge.getLastStepVehicleIDs(edge))
-                    new_vehicles = current_vehicles - previous_vehicles[edge]
-
-                    for veh_id in new_vehicles:
-                        if veh_id not in counted_vehicles:
-                            vehicle_counts[edge] += 1
-                            counted_vehicles.add(veh_id)
-
-                    previous_vehicles[edge] = current_vehicles.copy()
-
         total_time: float = cast(float, traci.simulation.getTime())
     finally:
         traci.close()
@@ -150,23 +159,24 @@ def get_saturation_flow() -> float:
 
     original_nodes_path = Path("data") / "nodes.xml"
     try:
-        tree = ET.parse(original_nodes_path)
-    except ET.ParseError as e:
-        raise RuntimeError(f"Failed to parse {original_nodes_path}") from e
-
-    root = tree.getroot()
-
-    modified_root = ET.Element("nodes")
-    for node in root.findall("node"):
-        node_copy = ET.Element("node", node.attrib)
-        if node_copy.get("id") == "J0":
-            node_copy.set("type", "priority")
-        modified_root.append(node_copy)
+        nodes_xml = original_nodes_path.read_text(encoding="utf-8")
+    except OSError as e:
+        raise RuntimeError(f"Failed to read {original_nodes_path}") from e
+
+    # Only J0's type changes, so patch that tag in the raw text instead of
+    # round-tripping the whole file through ElementTree
+    def as_priority(match: re.Match[str]) -> str:
+        node = match.group(0)
+        if _TYPE_ATTR.search(node):
+            return _TYPE_ATTR.sub('type="priority"', node, count=1)
+        return node.replace("<node", '<node type="priority"', 1)
+
+    nodes_xml, found = _J0_NODE.subn(as_priority, nodes_xml)
+    if not found:
+        raise RuntimeError(f"Junction J0 not found in {original_nodes_path}")
 
     nodes_path = Path(tmp_dir) / "nodes.xml"
-    ET.ElementTree(modified_root).write(
-        str(nodes_path), encoding="utf-8", xml_declaration=True
-    )
+    nodes_path.write_text(nodes_xml, encoding="utf-8")
 
     try:
         subprocess.run(
@@ -204,35 +214,33 @@ def average_queue_length_per_edge(queue_output_path: str) -> Dict[str, float]:
     Raises:
         RuntimeError: If XML parsing fails
     """
+    edge_totals: Dict[str, float] = {}
+    edge_counts: Dict[str, int] = {}
+
+    # Stream lane by lane, keeping only a running sum and count per edge,
+    # and drop each <data> timestep once read so memory stays O(edges)
+    # however long the queue output is
     try:
-        tree = ET.parse(queue_output_path)
+        for _, elem in ET.iterparse(queue_output_path, tag=("lane", "data")):
+            if elem.tag == "lane":
+                # lane "<edge>_<index>" -> edge "<edge>"
+                edge = elem.get("id").rpartition("_")[0]
+                edge_totals[edge] = (edge_totals.get(edge, 0.0)
+                                     + float(elem.get("queueing_length", 0.0)))
+                edge_counts[edge] = edge_counts.get(edge, 0) + 1
+                elem.clear()
+            else:
+                elem.clear()
+                while elem.getprevious() is not None:
+                    del elem.getparent()[0]
     except ET.ParseError as e:
         raise RuntimeError(f"Failed to parse {queue_output_path}") from e
 
-    root = tree.getroot()
-
-    edge_totals: Dict[str, float] = defaultdict(float)
-    edge_counts: Dict[str, int] = defaultdict(int)
-
-    for timestep in root.findall("data"):
-        lanes = timestep.find("lanes")
-        if lanes is None:
-            continue
-        for lane in lanes.findall("lane"):
-            lane_id = lane.attrib["id"]
-            edge_id = "_".join(lane_id.split("_")[:-1])
-            queue_length: float = float(
-                lane.attrib.get("queueing_length", 0.0))
-
-            edge_totals[edge_id] += queue_length
-            edge_counts[edge_id] += 1
-
-    if not edge_totals:
+    if not edge_counts:
         raise RuntimeError("No queueing data found in file")
 
-    edge_averages: Dict[str, float] = {
-        edge: round(edge_totals[edge] / edge_counts[edge], 2)
-        for edge in edge_totals
+    # dicts keep edges in order of first appearance, as in the queue output
+    return {
+        edge: round(total / edge_counts[edge], 2)
+        for edge, total in edge_totals.items()
     }
-
-    return edge_averages
@@ -1,90 +1,138 @@
-import xml.etree.ElementTree as ET
+import csv
+from lxml import etree as ET
+import numpy as np
 import pandas as pd
+import matplotlib
+matplotlib.use('Agg')  # reports are only written to disk, no GUI needed
 import matplotlib.pyplot as plt
 import os
+from concurrent.futures import Executor, Future
+from typing import Dict, Optional, Tuple
 
 
-# --- Configuration ---
-def generate_traffic_report(xml_file: str, output_image: str) -> None:
-    """
-    Generates a comprehensive traffic analysis report from SUMO tripinfo XML.
+# tripinfo attributes read as float64 columns
+_FLOAT_COLUMNS = (
+    'depart', 'arrival', 'duration', 'routeLength', 'waitingTime',
+    'stopTime', 'timeLoss', 'departDelay',
+)
 
-    Args:
-        xml_file (str): Path to SUMO's tripinfo.xml file
-        output_image (str): Path to save the output visualization image
+# one record per trip; `id` (a string) is kept in a separate list
+_TRIPINFO_DT = np.dtype(
+    [(name, 'f8') for name in _FLOAT_COLUMNS] + [('waitingCount', 'i4')])
 
-    Outputs:
-        - Visualization image with traffic metrics
-        - CSV file with aggregated statistics (same base name as output_image)
+# above this many trips the time-loss plot is drawn as a hexbin density
+_SCATTER_MAX_POINTS = 5000
+
+
+def _grow(column: np.ndarray, capacity: int) -> np.ndarray:
+    """Return a copy of `column` enlarged to `capacity` elements."""
+    grown = np.empty(capacity, dtype=column.dtype)
+    grown[:len(column)] = column
+    return grown
+
+
+def _compute_stats(xml_file: str) -> Optional[Tuple[pd.DataFrame, Dict[str, float]]]:
+    """
+    Parses SUMO tripinfo XML into a per-trip DataFrame and its aggregate summary.
+
+    Returns None (after printing why) if the file is missing, malformed or empty.
     """
     # --- Parse XML and Create DataFrame ---
+    # Stream the file: lxml only yields <tripinfo> elements, each is read
+    # once as it closes and then freed, so the full DOM is never built.
+    # Values go straight into one structured array (grown by doubling)
+    # rather than one dict per trip.
+    capacity = 1024
+    trips = np.empty(capacity, dtype=_TRIPINFO_DT)
+    ids = []
+    n = 0
     try:
-        root = ET.parse(xml_file).getroot()
+        for _, trip in ET.iterparse(xml_file, tag='tripinfo'):
+            if n == capacity:
+                capacity *= 2
+                trips = _grow(trips, capacity)
+
+            a = trip.attrib
+            ids.append(a.get('id'))
+            trips[n] = (*(float(a.get(name, 0.0)) for name in _FLOAT_COLUMNS),
+                        int(a.get('waitingCount', 0)))
+            n += 1
+
+            trip.clear()
+            # drop the already processed siblings from the root as we go
+            while trip.getprevious() is not None:
+                del trip.getparent()[0]
     except ET.ParseError as e:
         print(f"Error parsing XML file: {e}")
-        return
+        return None
     except FileNotFoundError:
         print(f"XML file not found: {xml_file}")
-        return
-
-    records = []
-    for trip in root.findall('tripinfo'):
-        records.append({
-            'id': trip.get('id'),
-            'depart': float(trip.get('depart', 0.0)),
-            'arrival': float(trip.get('arrival', 0.0)),
-            'duration': float(trip.get('duration', 0.0)),
-            'routeLength': float(trip.get('routeLength', 0.0)),
-            'waitingTime': float(trip.get('waitingTime', 0.0)),
-            'stopTime': float(trip.get('stopTime', 0.0)),
-            'timeLoss': float(trip.get('timeLoss', 0.0)),
-            'departDelay': float(trip.get('departDelay', 0.0)),
-            'waitingCount': int(trip.get('waitingCount', 0)),
-            'route': (trip.get('id') or "").split('.')[0],
-        })
-
-    if not records:
+        return None
+
+    if n == 0:
         print("No trip data found in XML file")
-        return
+        return None
 
-    df = pd.DataFrame(records)
+    # columns are handed to pandas as field views of the structured array
+    trips = trips[:n]
+    df = pd.DataFrame({
+        'id': ids,
+        **{name: trips[name] for name in _TRIPINFO_DT.names},
+    })
+    # route is the id up to the first '.', one compiled-regex pass over the column
+    df['route'] = df['id'].fillna("").str.extract(r'^([^.]*)', expand=False)
 
     # --- Calculate Aggregate Statistics ---
+    # One agg call for the column reductions; the departDelay mask is
+    # computed once and reused
+    stats = df.agg({
+        'duration': ['mean', 'sum'],
+        'arrival': 'max',
+        'depart': 'min',
+        'routeLength': 'sum',
+        'timeLoss': 'mean',
+        'waitingTime': ['sum', 'mean'],
+        'waitingCount': 'sum',
+    })
+    depart_delay = df['departDelay'].to_numpy()
+    delayed = depart_delay > 0
+
     summary = {
         'total_trips': len(df),
-        'avg_duration': df['duration'].mean(),
-        'total_simulation_time': df['arrival'].max() - df['depart'].min(),
-        'avg_speed_kmh': (df['routeLength'].sum() / df['duration'].sum() * 3.6).round(2),
-        'avg_time_loss': df['timeLoss'].mean(),
-        'total_waiting_time': df['waitingTime'].sum(),
-        'avg_waiting_time': df['waitingTime'].mean(),
-        'total_stops': df['waitingCount'].sum(),
-        'delayed_departures': (df['departDelay'] > 0).sum(),
-        'avg_depart_delay': df.loc[df['departDelay'] > 0, 'departDelay'].mean(),
-        'total_distance_km': (df['routeLength'].sum() / 1000).round(2),
+        'avg_duration': stats.at['mean', 'duration'],
+        'total_simulation_time': stats.at['max', 'arrival'] - stats.at['min', 'depart'],
+        'avg_speed_kmh': round(stats.at['sum', 'routeLength'] / stats.at['sum', 'duration'] * 3.6, 2),
+        'avg_time_loss': stats.at['mean', 'timeLoss'],
+        'total_waiting_time': stats.at['sum', 'waitingTime'],
+        'avg_waiting_time': stats.at['mean', 'waitingTime'],
+        'total_stops': int(stats.at['sum', 'waitingCount']),
+        'delayed_departures': int(delayed.sum()),
+        'avg_depart_delay': depart_delay[delayed].mean() if delayed.any() else np.nan,
+        'total_distance_km': round(stats.at['sum', 'routeLength'] / 1000, 2),
     }
 
-    # --- Export Aggregate CSV ---
-    csv_path = os.path.splitext(output_image)[0] + '_summary.csv'
-    pd.DataFrame([summary]).to_csv(csv_path, index=False)
-    print(f"Aggregate statistics saved to {csv_path}")
+    return df, summary
 
-    # --- Visualization ---
-    plt.figure(figsize=(16, 18), dpi=300)
 
+def _render(df: pd.DataFrame, output_image: str) -> None:
+    """Draws the per-trip charts of a report and saves them to `output_image`."""
+    # --- Visualization ---
     plt.figure(figsize=(16, 18), dpi=300)
 
     # 1) Histogram of trip durations
     ax1 = plt.subplot(3, 1, 1)
-    ax1.hist(df['duration'], bins=20)
+    # bin in NumPy so matplotlib only draws the 20 bars
+    counts, edges = np.histogram(df['duration'].to_numpy(), bins=20)
+    ax1.bar(edges[:-1], counts, width=np.diff(edges), align='edge')
     ax1.set_title("Distribution of Trip Durations")
     ax1.set_xlabel("Duration (s)")
     ax1.set_ylabel("Number of Trips")
 
     # 2) Bar chart of average waiting time per route
     ax2 = plt.subplot(3, 1, 2)
+    # the groups are re-sorted by value right away, so skip the key sort
     wait_by_route = df.groupby(
-        'route')['waitingTime'].mean().sort_values(ascending=False)
+        'route', sort=False)['waitingTime'].mean().sort_values(ascending=False)
     ax2.bar(wait_by_route.index, wait_by_route.to_numpy())
     ax2.set_title("Average Waiting Time by Route")
     ax2.set_xlabel("Route ID")
@@ -93,7 +141,11 @@ def generate_traffic_report(xml_file: str, output_image: str) -> None:
 
     # 3) Scatter: time loss vs route length
     ax3 = plt.subplot(3, 1, 3)
-    ax3.scatter(df['routeLength'], df['timeLoss'], alpha=0.7)
+    if len(df) > _SCATTER_MAX_POINTS:
+        # one marker path per trip gets slow; draw a density grid instead
+        ax3.hexbin(df['routeLength'], df['timeLoss'], gridsize=40, mincnt=1)
+    else:
+        ax3.scatter(df['routeLength'], df['timeLoss'], alpha=0.7)
     ax3.set_title("Time Loss vs. Route Length")
     ax3.set_xlabel("Route Length (m)")
     ax3.set_ylabel("Time Loss (s)")
@@ -102,3 +154,49 @@ def generate_traffic_report(xml_file: str, output_image: str) -> None:
     plt.savefig(output_image)
     plt.close()
     print(f"Visualization saved to {output_image}")
+
+
+# --- Configuration ---
+def generate_traffic_report(
+    xml_file: str,
+    output_image: str,
+    executor: Optional[Executor] = None
+) -> Optional[Future]:
+    """
+    Generates a comprehensive traffic analysis report from SUMO tripinfo XML.
+
+    Args:
+        xml_file (str): Path to SUMO's tripinfo.xml file
+        output_image (str): Path to save the output visualization image
+        executor (Executor, optional): If given, the (slow) figure rendering is
+            submitted to it instead of blocking the caller. The XML is always parsed
+            and the CSV written before returning, so `xml_file` may be overwritten
+            right away. Use a process pool: pyplot is not thread-safe.
+
+    Returns:
+        Future | None: The pending render when `executor` is given, otherwise None.
+
+    Outputs:
+        - Visualization image with traffic metrics
+        - CSV file with aggregated statistics (same base name as output_image)
+    """
+    stats = _compute_stats(xml_file)
+    if stats is None:
+        return None
+    df, summary = stats
+
+    # --- Export Aggregate CSV ---
+    csv_path = os.path.splitext(output_image)[0] + '_summary.csv'
+    # a single header and value row; written directly, as pandas would
+    # (missing values, e.g. no delayed departures, as empty fields)
+    with open(csv_path, 'w', newline='') as f:
+        writer = csv.writer(f, lineterminator=os.linesep)
+        writer.writerow(summary.keys())
+        writer.writerow('' if pd.isna(value) else value
+                        for value in summary.values())
+    print(f"Aggregate statistics saved to {csv_path}")
+
+    if executor is not None:
+        return executor.submit(_render, df, output_image)
+    _render(df, output_image)
+    return None
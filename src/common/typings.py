@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import Callable, List, Tuple
+from typing import Callable, Dict, List, Tuple
 
 
 @dataclass
@@ -20,12 +20,21 @@ class PhaseConfig:
     all_red: float
 
 
+@dataclass(frozen=True)
+class ConnectionGroups:
+    # (green, amber) tlLogic state strings per approach, and the all-red state
+    phase_states: Tuple[Tuple[str, str], ...]
+    all_red_state: str
+
+
 TrafficConfiguration = List[PhaseConfig]
 Population = List[TrafficConfiguration]
 FitnessFunc = Callable[[TrafficConfiguration], float]
+# fitness score per configuration, keyed by its (green, amber, all_red) tuples
+ScoreCache = Dict[Tuple[Tuple[float, float, float], ...], float]
 
 PopulateFunc = Callable[[], Population]
-SelectionFunc = Callable[[Population, FitnessFunc],
+SelectionFunc = Callable[[Population, List[float]],
                          Tuple[TrafficConfiguration, TrafficConfiguration]]
 CrossoverFunc = Callable[[TrafficConfiguration, TrafficConfiguration],
                          Tuple[TrafficConfiguration, TrafficConfiguration, TrafficConfiguration]]
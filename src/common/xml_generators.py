@@ -1,74 +1,97 @@
-import xml.etree.ElementTree as ET
-from .typings import TrafficConfiguration
+from lxml import etree as ET
+from .typings import ConnectionGroups, TrafficConfiguration
+from functools import lru_cache
+import os
 import tempfile
 from pathlib import Path
 
+# signal state codes in a tlLogic phase state string
+_GREEN = ord('G')
+_AMBER = ord('y')
 
-def generate_tl_logic(input_path: str, output_path: str, traffic_configuration: TrafficConfiguration):
+_TL_LOGIC_HEADER = '''<additional>
+  <tlLogics version="1.16">
+    <tlLogic id="J0" type="static" programID="1" offset="0">
+'''
+_PHASE_FMT = '      <phase duration="{}" state="{}"/>\n'
+_TL_LOGIC_FOOTER = '''    </tlLogic>
+  </tlLogics>
+</additional>'''
+
+
+def precompute_groups(input_path: str) -> ConnectionGroups:
+    """Parse a connections file into per-approach link index groups.
+
+    connections.xml is static for a run, while the GA writes a tl_logic.xml
+    for every fitness evaluation, so the result is cached and only recomputed
+    when the file's modification time changes.
+    """
+    return _load_groups(input_path, os.path.getmtime(input_path))
+
+
+@lru_cache(maxsize=4)
+def _load_groups(input_path: str, mtime: float) -> ConnectionGroups:
     # Parse the input XML file
     tree = ET.parse(input_path)
     root = tree.getroot()
 
-    # Find all connection elements with tl and linkIndex attributes
-    connections = []
-    for conn in root.findall('connection'):
-        if 'tl' in conn.attrib and 'linkIndex' in conn.attrib:
-            connections.append(conn)
-
-    # Group connections by 'from' attribute, preserving order of first occurrence
-    groups_order = []
+    # Group the TL-controlled connections (those with tl and linkIndex) by
+    # 'from' in one pass; dicts keep the order of first occurrence
     groups = {}
-    for conn in connections:
-        from_attr = conn.get('from')
-        link_index = int(conn.get('linkIndex'))
-        if from_attr not in groups:
-            groups_order.append(from_attr)
-            groups[from_attr] = []
-        groups[from_attr].append(link_index)
+    for conn in root.iter('connection'):
+        a = conn.attrib
+        if 'tl' in a and 'linkIndex' in a:
+            groups.setdefault(a.get('from'), []).append(int(a['linkIndex']))
 
-    # Validate config-group count match
-    if len(groups_order) != len(traffic_configuration):
-        raise ValueError(
-            "Number of PhaseConfigs must match number of connection groups")
+    link_groups = list(groups.values())
 
     # Determine total number of links
-    total_links = max([max(indices)
-                      for indices in groups.values()]) + 1 if groups else 0
+    total_links = max(max(indices) for indices in link_groups) + 1 if link_groups else 0
+
+    # The state strings only depend on the groups, so they are built here
+    # once instead of on every tl_logic.xml write
+    all_red_state = 'r' * total_links
+    phase_states = []
+    for link_indices in link_groups:
+        state = bytearray(all_red_state, 'ascii')
+        for idx in link_indices:
+            state[idx] = _GREEN
+        green_state = state.decode('ascii')
+        for idx in link_indices:
+            state[idx] = _AMBER
+        phase_states.append((green_state, state.decode('ascii')))
 
-    # Generate phases for each group with its own config
-    phases = []
-    for from_attr, config in zip(groups_order, traffic_configuration):
-        link_indices = groups[from_attr]
+    return ConnectionGroups(
+        phase_states=tuple(phase_states),
+        all_red_state=all_red_state
+    )
 
-        # Green phase
-        state = ['r'] * total_links
-        for idx in link_indices:
-            state[idx] = 'G'
-        phases.append(f'''      <phase duration="{
-                      config.green}" state="{"".join(state)}"/>''')
 
-        # Amber phase
-        state = ['r'] * total_links
-        for idx in link_indices:
-            state[idx] = 'y'
-        phases.append(f'''      <phase duration="{
-                      config.amber}" state="{"".join(state)}"/>''')
+def generate_tl_logic(input_path: str, output_path: str, traffic_configuration: TrafficConfiguration):
+    write_tl_logic(precompute_groups(input_path),
+                   output_path, traffic_configuration)
 
-        # All-red phase
-        phases.append(f'''      <phase duration="{config.all_red}" state="{
-                      "".join(["r"] * total_links)}"/>''')
 
-    # Construct and write output XML
-    output_xml = f'''<additional>
-  <tlLogics version="1.16">
-    <tlLogic id="J0" type="static" programID="1" offset="0">
-{"\n".join(phases)}
-    </tlLogic>
-  </tlLogics>
-</additional>'''
+def write_tl_logic(connection_groups: ConnectionGroups, output_path: str, traffic_configuration: TrafficConfiguration):
+    phase_states = connection_groups.phase_states
+    all_red_state = connection_groups.all_red_state
+
+    # Validate config-group count match
+    if len(phase_states) != len(traffic_configuration):
+        raise ValueError(
+            "Number of PhaseConfigs must match number of connection groups")
 
-    with open(output_path, 'w') as f:
-        f.write(output_xml)
+    # Green, amber and all-red phase for each group with its own config
+    out = [_TL_LOGIC_HEADER]
+    for (green_state, amber_state), config in zip(phase_states, traffic_configuration):
+        out.append(_PHASE_FMT.format(config.green, green_state))
+        out.append(_PHASE_FMT.format(config.amber, amber_state))
+        out.append(_PHASE_FMT.format(config.all_red, all_red_state))
+    out.append(_TL_LOGIC_FOOTER)
+
+    # Materialize and write the output XML once, as raw bytes (the document
+    # is pure ASCII, so no text-layer encoding or newline translation)
+    Path(output_path).write_bytes("".join(out).encode('ascii'))
 
 
 def saturation_flow_scenario():
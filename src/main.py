@@ -1,108 +1,143 @@
+import multiprocessing
 import subprocess
 import os
-from algorithms.ga import generate_population, run_evolution
+from concurrent.futures import ProcessPoolExecutor
+from algorithms.ga import generate_population, run_evolution, load_score_cache, save_score_cache
 from algorithms.websters import websters_method
-from common.data_capture import get_average_flow, get_saturation_flow, average_queue_length_per_edge
+from common.data_capture import get_saturation_flow, average_queue_length_per_edge
 from common.typings import IntersectionParams
-from common.xml_generators import generate_tl_logic
+from common.xml_generators import precompute_groups, write_tl_logic
 from common.run_baseline_sim import runBaseline
 from common.export_data import generate_traffic_report
 from pprint import pprint
 
+
 # Main CLI
-saturation_flow = get_saturation_flow()
-runBaseline()
-average_flows = get_average_flow()
-
-subprocess.run(
-    [
-        "netconvert",
-        "-n", "data/nodes.xml",
-        "-e", "data/edges.xml",
-        "-x", "data/connections.xml",
-        "-o", "data/net.xml",
-        "--verbose"
-    ],
-    check=True,       # raises if SUMO exits non-zero
-    capture_output=True,
-    text=True
-)
-
-subprocess.run(
-    [
-        "sumo",
-        "-n", "data/net.xml",
-        "-r", "data/routes.xml",
-        "--tripinfo-output", "tripinfo.xml",
-        "--queue-output", "q_.xml",
-        "--verbose"
-    ],
-    check=True,       # raises if SUMO exits non-zero
-    capture_output=True,
-    text=True
-)
-
-print(average_queue_length_per_edge("q_.xml"))
-generate_traffic_report("tripinfo.xml", "Initial_traffic_bySUMO.png")
-
-intersection_params = IntersectionParams(
-    saturation_flows=[saturation_flow, saturation_flow,
-                      saturation_flow, saturation_flow],
-    lambda_rates=[round(average_flows['W_in']/60, 2),
-                  round(average_flows['E_in']/60, 2), round(average_flows['N_in']/60, 2)],
-    reaction_time=1.0,                    # s
-    road_widths=[3.2, 3.2, 3.2, 3.2],          # m
-    vehicle_speed=13.89,                  # m/s
-    deceleration_rate=4.5,                # m/s^2
-    vehicle_length=5                      # m
-)
-
-population = generate_population(
-    size=20, intersection_params=intersection_params)
-
-pprint(population)
-
-generate_tl_logic('data/connections.xml', "tl_logic.xml", population[0])
-
-subprocess.run(
-    [
-        "sumo",
-        "-n", "data/net.xml",
-        "-r", "data/routes.xml",
-        "--tripinfo-output", "tripinfo.xml",
-        "--additional-files", "tl_logic.xml",
-        "--verbose"
-    ],
-    check=True,       # raises if SUMO exits non-zero
-    capture_output=True,
-    text=True
-)
-
-generate_traffic_report("tripinfo.xml", "Initial_traffic_byWebsters.png")
-
-pop = run_evolution(population)
-
-tl_xml = generate_tl_logic('data/connections.xml', "tl_logic.xml", pop[0][0])
-
-subprocess.run(
-    [
-        "sumo",
-        "-n", "data/net.xml",
-        "-r", "data/routes.xml",
-        "--tripinfo-output", "tripinfo.xml",
-        "--additional-files", "tl_logic.xml",
-        "--verbose"
-    ],
-    check=True,       # raises if SUMO exits non-zero
-    capture_output=True,
-    text=True
-)
-
-generate_traffic_report("tripinfo.xml", "finalGA.png")
-print("Initial Websters")
-# population.sort(key=lambda config: fitness(config))
-print(population[0])
-
-
-print("Final GA")
-print(pop[0][0])
+def main() -> None:
+    # Report figures are rendered in the background while the next SUMO run
+    # goes. Its workers are spawned, and the GA starts its fitness workers
+    # from a forkserver (see ga._POOL_CONTEXT), so no pool is ever forked
+    # from this process once it runs the executor's threads.
+    with ProcessPoolExecutor(
+        max_workers=2,
+        mp_context=multiprocessing.get_context("spawn")
+    ) as report_pool:
+        pending_reports = []
+
+        saturation_flow = get_saturation_flow()
+        # runBaseline also measures the flows of the no-traffic-light network
+        average_flows = runBaseline()
+
+        intersection_params = IntersectionParams(
+            saturation_flows=[saturation_flow, saturation_flow,
+                              saturation_flow, saturation_flow],
+            lambda_rates=[round(average_flows['W_in']/60, 2),
+                          round(average_flows['E_in']/60, 2), round(average_flows['N_in']/60, 2)],
+            reaction_time=1.0,                    # s
+            road_widths=[3.2, 3.2, 3.2, 3.2],          # m
+            vehicle_speed=13.89,                  # m/s
+            deceleration_rate=4.5,                # m/s^2
+            vehicle_length=5                      # m
+        )
+
+        population = generate_population(
+            size=20, intersection_params=intersection_params)
+
+        pprint(population)
+
+        connection_groups = precompute_groups('data/connections.xml')
+        write_tl_logic(connection_groups, "tl_logic.xml", population[0])
+
+        subprocess.run(
+            [
+                "netconvert",
+                "-n", "data/nodes.xml",
+                "-e", "data/edges.xml",
+                "-x", "data/connections.xml",
+                "-o", "data/net.xml"
+            ],
+            check=True,       # raises if SUMO exits non-zero
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+
+        # The default-program and Webster runs are independent, so run them
+        # side by side, each with its own output files
+        baseline_sim = subprocess.Popen(
+            [
+                "sumo",
+                "-n", "data/net.xml",
+                "-r", "data/routes.xml",
+                "--tripinfo-output", "tripinfo_baseline.xml",
+                "--queue-output", "q_.xml"
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        websters_sim = subprocess.Popen(
+            [
+                "sumo",
+                "-n", "data/net.xml",
+                "-r", "data/routes.xml",
+                "--tripinfo-output", "tripinfo_websters.xml",
+                "--additional-files", "tl_logic.xml"
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        for sim in (baseline_sim, websters_sim):
+            if sim.wait() != 0:  # raises if SUMO exits non-zero
+                raise subprocess.CalledProcessError(sim.returncode, sim.args)
+
+        print(average_queue_length_per_edge("q_.xml"))
+        pending_reports.append(generate_traffic_report(
+            "tripinfo_baseline.xml", "Initial_traffic_bySUMO.png", executor=report_pool))
+        pending_reports.append(generate_traffic_report(
+            "tripinfo_websters.xml", "Initial_traffic_byWebsters.png", executor=report_pool))
+
+        # Fitness scores are kept between runs as long as the network and demand
+        # they were simulated on are unchanged
+        score_cache_path = ".fitness_cache.json"
+        simulation_inputs = ["data/nodes.xml", "data/edges.xml",
+                             "data/connections.xml", "data/routes.xml"]
+        score_cache = load_score_cache(score_cache_path, simulation_inputs)
+
+        pop = run_evolution(population, score_cache=score_cache)
+
+        save_score_cache(score_cache_path, simulation_inputs, score_cache)
+
+        write_tl_logic(connection_groups, "tl_logic.xml", pop[0][0])
+
+        subprocess.run(
+            [
+                "sumo",
+                "-n", "data/net.xml",
+                "-r", "data/routes.xml",
+                "--tripinfo-output", "tripinfo_ga.xml",
+                "--additional-files", "tl_logic.xml"
+            ],
+            check=True,       # raises if SUMO exits non-zero
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+
+        pending_reports.append(generate_traffic_report(
+            "tripinfo_ga.xml", "finalGA.png", executor=report_pool))
+        print("Initial Websters")
+        # population.sort(key=lambda config: fitness(config))
+        print(population[0])
+
+
+        print("Final GA")
+        print(pop[0][0])
+
+        # wait for the figures, re-raising any rendering error
+        for report in pending_reports:
+            if report is not None:
+                report.result()
+
+
+# Guarded so that importing this module (e.g. a spawned worker of the
+# fitness or report process pools) does not re-run the whole pipeline
+if __name__ == "__main__":
+    main()
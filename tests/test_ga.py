@@ -0,0 +1,54 @@
+import contextlib
+import io
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'src'))
+
+from algorithms.ga import run_evolution  # noqa: E402
+from common.typings import PhaseConfig  # noqa: E402
+
+
+def total_green(traffic_configuration):
+    """Stand-in for the SUMO fitness: shorter green times score better.
+
+    Defined at module level so the GA's worker processes can unpickle it.
+    """
+    return float(sum(phase.green for phase in traffic_configuration))
+
+
+class RunEvolutionTest(unittest.TestCase):
+
+    def setUp(self):
+        random.seed(0)
+        self.population = [
+            [PhaseConfig(random.randint(5, 60), 3, 1) for _ in range(3)]
+            for _ in range(10)
+        ]
+
+    def evolve(self, generation_limit):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return run_evolution(list(self.population), total_green,
+                                 generation_limit=generation_limit,
+                                 max_workers=2)
+
+    def test_population_size_is_constant(self):
+        population, _ = self.evolve(generation_limit=5)
+        self.assertEqual(len(population), len(self.population))
+
+    def test_elite_is_kept(self):
+        elite = min(self.population, key=total_green)
+        population, _ = self.evolve(generation_limit=1)
+        self.assertIn(elite, population)
+
+    def test_best_score_never_gets_worse(self):
+        initial_best = min(map(total_green, self.population))
+        population, _ = self.evolve(generation_limit=5)
+        self.assertLessEqual(total_green(population[0]), initial_best)
+
+
+if __name__ == '__main__':
+    unittest.main()